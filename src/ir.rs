@@ -32,9 +32,16 @@ pub enum EventKind {
 struct Cursor {
     current_tick: u64,
     last_duration: Rational, 
+    // Raw text of the last explicit duration (e.g. ":8."), so repeats skip re-parsing
+    last_literal: String,
     last_octave: u8,
     // Time Scalar for Tuplets. Standard = 1/1. Triplet = 2/3.
+    // An input to cached_ticks: only set_time_scalar() may write it
     time_scalar: Rational,
+    // Ticks for last_duration under time_scalar; cleared when either changes
+    cached_ticks: Option<u64>,
+    // Set once this voice has pushed an event (rest-only and empty voices never do)
+    emitted: bool,
     ppq: u32, 
 }
 
@@ -43,68 +50,102 @@ impl Cursor {
         Self {
             current_tick: 0,
             last_duration: Rational::new(1, 4), 
+            last_literal: String::new(),
             last_octave: 4,  
             time_scalar: Rational::new(1, 1),
+            cached_ticks: None,
+            emitted: false,
             ppq,
         }
     }
 
+    fn set_time_scalar(&mut self, scalar: Rational) {
+        self.time_scalar = scalar;
+        self.cached_ticks = None;
+    }
+
     fn parse_duration(&mut self, d_str: Option<&String>) -> u64 {
-        let base_rat = if let Some(s) = d_str {
-            let raw = &s[1..];
-            let dots = raw.chars().filter(|&c| c == '.').count();
-            let base_str: String = raw.chars().take_while(|&c| c != '.').collect();
-            let denominator: u64 = base_str.parse().unwrap_or(4);
-            
-            let mut rat = Rational::new(1, denominator);
-            if dots == 1 { rat = Rational::new(3, denominator * 2); }
-            else if dots == 2 { rat = Rational::new(7, denominator * 4); }
-            
-            self.last_duration = rat;
-            rat
-        } else {
-            self.last_duration
-        };
+        if let Some(s) = d_str {
+            // Explicit durations usually repeat the previous one verbatim
+            if *s != self.last_literal {
+                // Lexer guarantees ":<digits><dots>", so slice instead of allocating.
+                let raw = &s[1..];
+                let base_str = raw.trim_end_matches('.');
+                let dots = raw.len() - base_str.len();
+                // Validated once here so ":0" cannot reach Rational::new as a zero divisor
+                let denominator: u64 = base_str.parse().ok().filter(|&d| d != 0).unwrap_or(4);
+
+                // Spec 5.1.1: each dot adds half the previous value, so n dots
+                // give exactly (2^(n+1) - 1) / (den * 2^n). Values that cannot be
+                // represented (over MAX_DOTS, or den * 2^n past u64) fall back to a quarter.
+                let pow = 1u64 << dots.min(MAX_DOTS);
+                self.last_duration = match denominator.checked_mul(pow) {
+                    Some(den) if dots <= MAX_DOTS => Rational::new(2 * pow - 1, den),
+                    _ => Rational::new(1, 4),
+                };
+                self.cached_ticks = None;
+
+                // Reuses the buffer, so this stops allocating after warm-up
+                self.last_literal.clear();
+                self.last_literal.push_str(s);
+            }
+        }
+        // Sticky durations resolve to the same ticks until duration or scalar change
+        if let Some(ticks) = self.cached_ticks {
+            return ticks;
+        }
 
         // Apply Time Scalar (for Tuplets)
         // Duration = Base * Scalar
         // e.g. 1/8 * (2/3) = 1/12 (Triplet eighth)
-        let final_rat = Rational::new(
-            base_rat.num * self.time_scalar.num,
-            base_rat.den * self.time_scalar.den
-        );
+        let final_rat = self.last_duration * self.time_scalar;
 
-        final_rat.to_ticks(self.ppq)
+        let ticks = final_rat.to_ticks(self.ppq);
+        self.cached_ticks = Some(ticks);
+        ticks
     }
 
     fn parse_pitch(&mut self, p_str: &str) -> u8 {
-        let chars: Vec<char> = p_str.chars().collect();
-        if chars.is_empty() { return 60; }
-        let step = chars[0].to_ascii_lowercase();
-        let mut base = match step {
-            'c' => 0, 'd' => 2, 'e' => 4, 'f' => 5, 'g' => 7, 'a' => 9, 'b' => 11, _ => 0
+        // Lexer shape (Spec 6.1): [Step] [Accidental?] [Octave digit?]
+        let bytes = p_str.as_bytes();
+        if bytes.is_empty() { return 60; }
+        let base: i16 = match bytes[0].to_ascii_lowercase() {
+            b'c' => 0, b'd' => 2, b'e' => 4, b'f' => 5, b'g' => 7, b'a' => 9, b'b' => 11, _ => 0
         };
-        let mut octave = self.last_octave; 
-        let mut has_explicit_octave = false;
-        let mut i = 1;
-        while i < chars.len() {
-            match chars[i] {
-                '#' => base += 1, 'b' => base -= 1, 
-                c if c.is_digit(10) => {
-                    if !has_explicit_octave {
-                        octave = c.to_digit(10).unwrap() as u8;
-                        has_explicit_octave = true;
-                    }
-                }
-                _ => {}
-            }
-            i += 1;
-        }
-        if has_explicit_octave { self.last_octave = octave; }
-        (octave + 1) * 12 + base
+        let last = bytes[bytes.len() - 1];
+        let accidental = if bytes.len() > 1 && last.is_ascii_digit() {
+            self.last_octave = last - b'0';
+            &bytes[1..bytes.len() - 1]
+        } else {
+            &bytes[1..]
+        };
+        // Single lookup for the chromatic offset; microtonal accidentals
+        // (qs, qf, tqs, tqf) have no MIDI semitone and resolve to natural.
+        let alter: i16 = match accidental {
+            [b'#'] => 1,
+            [b'b' | b'B'] => -1,
+            [b'x' | b'X'] => 2,
+            [b'b' | b'B', b'b' | b'B'] => -2,
+            _ => 0,
+        };
+        let midi = (self.last_octave as i16 + 1) * 12 + base + alter;
+        midi.clamp(0, 127) as u8
     }
 }
 
+/// Internal tick resolution (pulses per quarter note)
+const PPQ: u32 = 1920;
+
+/// Longest dot run honoured. Far beyond notated practice (which stops at
+/// three or four), and keeps `num * 4 * PPQ` in `Rational::to_ticks` inside u64.
+const MAX_DOTS: usize = 16;
+
+/// Linearization state for one staff: its Track and one Cursor per voice
+struct StaffState {
+    track: Track,
+    cursors: Vec<Cursor>,
+}
+
 pub fn compile(score: Score) -> Result<Timeline, String> {
     let mut timeline = Timeline {
         title: "Untitled".into(),
@@ -112,24 +153,36 @@ pub fn compile(score: Score) -> Result<Timeline, String> {
         tracks: HashMap::new(),
     };
 
+    // Map of StaffID -> Track under construction + [Cursor for Voice 1, Voice 2...]
+    let mut staves: HashMap<String, StaffState> = HashMap::new();
+
     // 1. Context Building
     for item in &score.items {
         match item {
             TopLevel::Meta(kvs) => {
                 for (k, v) in kvs {
                     if k == "title" { if let Value::Str(s) = v { timeline.title = s.clone(); } }
-                    else if k == "tempo" { if let Value::Num(n) = v { timeline.tempo = *n as u32; } }
+                    else if k == "tempo" {
+                        // Only positive BPM is meaningful; the MIDI backend divides by it
+                        if let Value::Num(n) = v {
+                            if let Ok(bpm) = u32::try_from(*n) { if bpm > 0 { timeline.tempo = bpm; } }
+                        }
+                    }
                 }
             },
             TopLevel::Def { id, label, attributes } => {
-                let mut patch = "Grand Piano".to_string();
-                for (attr, val) in attributes {
-                    if attr == "patch" { if let Value::Str(s) = val { patch = s.clone(); } }
-                }
-                timeline.tracks.insert(id.clone(), Track {
-                    label: label.clone(),
-                    patch,
-                    events: Vec::new(),
+                // Last `patch=` wins; only allocate the default when none is given
+                let patch = attributes.iter().rev()
+                    .find_map(|(attr, val)| match val {
+                        Value::Str(s) if attr == "patch" => Some(s.clone()),
+                        _ => None,
+                    })
+                    .unwrap_or_else(|| "Grand Piano".to_string());
+                staves.insert(id.clone(), StaffState {
+                    track: Track { label: label.clone(), patch, events: Vec::new() },
+                    // Voice cursors are created on first use. A trailing `|` opens
+                    // an empty voice too, so the cursor count overstates real voices.
+                    cursors: Vec::new(),
                 });
             },
             _ => {}
@@ -137,32 +190,24 @@ pub fn compile(score: Score) -> Result<Timeline, String> {
     }
 
     // 2. Linearization
-    let ppq = 1920;
-    // Map of StaffID -> [Cursor for Voice 1, Cursor for Voice 2...]
-    let mut cursors: HashMap<String, Vec<Cursor>> = HashMap::new();
-
-    for id in timeline.tracks.keys() {
-        // Start with 4 voices per track as default, can expand dynamically
-        cursors.insert(id.clone(), vec![
-            Cursor::new(ppq), Cursor::new(ppq), Cursor::new(ppq), Cursor::new(ppq)
-        ]);
-    }
-
-    for item in &score.items {
+    // Consume the AST measure by measure: each block is dropped as soon as
+    // it has been linearized, so only the Timeline grows with score length.
+    for item in score.items {
         if let TopLevel::Measure { content, .. } = item {
-            for stmt in content {
+            for stmt in &content {
                 match stmt {
                     Statement::Assignment { staff_id, voices } => {
-                        if let Some(track) = timeline.tracks.get_mut(staff_id) {
-                            let track_cursors = cursors.get_mut(staff_id).unwrap();
-                            
+                        // One lookup yields both the track and its voice cursors
+                        if let Some(staff) = staves.get_mut(staff_id) {
                             // Process each voice in parallel
                             for (v_idx, voice) in voices.iter().enumerate() {
-                                if v_idx >= track_cursors.len() {
-                                    track_cursors.push(Cursor::new(ppq));
+                                if v_idx >= staff.cursors.len() {
+                                    staff.cursors.push(Cursor::new(PPQ));
                                 }
-                                let cursor = &mut track_cursors[v_idx];
-                                process_voice(voice, cursor, track);
+                                let cursor = &mut staff.cursors[v_idx];
+                                let before = staff.track.events.len();
+                                process_voice(voice, cursor, &mut staff.track);
+                                cursor.emitted |= staff.track.events.len() > before;
                             }
                         }
                     },
@@ -172,9 +217,14 @@ pub fn compile(score: Score) -> Result<Timeline, String> {
         }
     }
 
-    // Sort events by tick (since multi-voice processing implies out-of-order insertion)
-    for track in timeline.tracks.values_mut() {
-        track.events.sort_by_key(|e| e.tick);
+    // Sort events by tick (since multi-voice processing implies out-of-order insertion).
+    // A single cursor only moves forward, so a track that only one voice wrote
+    // to is already in order, however many (empty) voices the staff opened.
+    for (id, mut staff) in staves {
+        if staff.cursors.iter().filter(|c| c.emitted).count() > 1 {
+            staff.track.events.sort_by_key(|e| e.tick);
+        }
+        timeline.tracks.insert(id, staff.track);
     }
 
     Ok(timeline)
@@ -213,21 +263,25 @@ fn process_voice(voice: &Voice, cursor: &mut Cursor, track: &mut Track) {
                 cursor.current_tick += ticks;
             },
             AstEvent::Tuplet { content, p, q } => {
+                // A zero ratio has no meaning; like ":0", ignore it rather than
+                // dividing by zero (p) or collapsing every duration (q)
+                if *p == 0 || *q == 0 {
+                    process_voice(content, cursor, track);
+                    continue;
+                }
+
                 // Spec 5.3: "Play P notes in the time of Q"
                 // Scalar = Q / P
                 let old_scalar = cursor.time_scalar;
                 let scale_factor = Rational::new(*q, *p);
                 
                 // Update scalar: New = Old * (Q/P)
-                cursor.time_scalar = Rational::new(
-                    old_scalar.num * scale_factor.num,
-                    old_scalar.den * scale_factor.den
-                );
+                cursor.set_time_scalar(old_scalar * scale_factor);
 
                 process_voice(content, cursor, track);
 
                 // Restore scalar
-                cursor.time_scalar = old_scalar;
+                cursor.set_time_scalar(old_scalar);
             },
             _ => {} // Tab/Percussion placeholders for now
         }
@@ -64,7 +64,7 @@ pub enum Token {
     // Strings: "Violin I" (Handles escaped quotes)
     #[regex(r#""([^"\\]|\\["\\bnfrt]|u[a-fA-F0-9]{4})*""#, |lex| {
         let s = lex.slice();
-        s[1..s.len()-1].to_string() // Strip surrounding quotes
+        unescape(&s[1..s.len()-1]) // Strip surrounding quotes
     })]
     StringLit(String),
 
@@ -94,4 +94,30 @@ pub enum Token {
     // Trap C-style comments to fail gracefully if user confuses syntax
     #[regex(r"//.*", |_| false)] 
     InvalidComment,
-}
\ No newline at end of file
+}
+
+/// Resolves the escapes admitted by `StringLit` in a single pass.
+/// Literals without a backslash (the common case) are copied as-is.
+fn unescape(body: &str) -> String {
+    if !body.contains('\\') {
+        return body.to_string();
+    }
+    let mut out = String::with_capacity(body.len());
+    let mut chars = body.chars();
+    while let Some(c) = chars.next() {
+        if c != '\\' {
+            out.push(c);
+            continue;
+        }
+        match chars.next() {
+            Some('n') => out.push('\n'),
+            Some('t') => out.push('\t'),
+            Some('r') => out.push('\r'),
+            Some('b') => out.push('\u{8}'),
+            Some('f') => out.push('\u{c}'),
+            Some(other) => out.push(other), // \" and \\
+            None => {}
+        }
+    }
+    out
+}
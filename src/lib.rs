@@ -28,6 +28,18 @@ impl Rational {
     }
 }
 
+impl std::ops::Mul for Rational {
+    type Output = Rational;
+
+    /// Exact product. Cross-reduces first so intermediates stay small
+    /// (nested tuplets would otherwise overflow u64 before reduction).
+    fn mul(self, rhs: Rational) -> Rational {
+        let g1 = self.num.gcd(&rhs.den);
+        let g2 = rhs.num.gcd(&self.den);
+        Rational::new((self.num / g1) * (rhs.num / g2), (self.den / g2) * (rhs.den / g1))
+    }
+}
+
 #[derive(Error, Debug)]
 pub enum TenutoError {
     #[error("E1001: Malformed Token at position {0}")]
@@ -1,5 +1,6 @@
 use clap::Parser;
 use std::path::PathBuf;
+use std::io::{BufWriter, Write};
 use logos::Logos;
 use chumsky::Parser as ChumskyParser; 
 use chumsky::Stream;
@@ -33,27 +34,31 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
         .map_err(|e| format!("F9001: Could not read file {:?}: {}", cli.input, e))?;
 
     // 2. Lexical Analysis
-    let lexer = Token::lexer(source.as_str());
-    let token_stream: Vec<(Token, std::ops::Range<usize>)> = lexer.spanned()
-        .map(|(tok, span)| match tok {
-            Ok(t) => (t, span),
-            Err(_) => (Token::InvalidComment, span), 
+    // Tokens are produced lazily and pulled by the parser as it advances.
+    // chumsky's Stream still buffers every token it pulls; what is saved is
+    // the separate collected Vec and the extra pass over it.
+    let mut token_count = 0usize;
+    let tokens = Token::lexer(source.as_str()).spanned()
+        .filter_map(|(tok, span)| match tok {
+            Ok(t) if t != Token::InvalidComment => Some((t, span)),
+            _ => None,
         })
-        .filter(|(tok, _)| *tok != Token::InvalidComment) 
-        .collect();
-
-    println!("✅ Phase 1: Lexing Complete ({} tokens)", token_stream.len());
+        .inspect(|_| token_count += 1);
 
     // 3. Parsing
-    let len = source.chars().count();
+    // Logos spans are byte offsets, so EOI sits at the byte length (no re-scan).
+    let len = source.len();
     let eoi = len..len + 1; 
-    let stream = Stream::from_iter(eoi, token_stream.into_iter());
+    let stream = Stream::from_iter(eoi, tokens);
 
     let (ast, parse_errs) = parser().parse_recovery(stream);
     for err in parse_errs { println!("❌ Parse Error: {:?}", err); }
 
     if let Some(score) = ast {
-        println!("✅ Phase 2: Parsing Complete.");
+        // Lexing and parsing are interleaved, so they finish together. Tokens are
+        // counted as the parser pulls them: the root parser has no end(), so this
+        // is the number consumed, not necessarily every token in the file.
+        println!("✅ Phase 1+2: Lexed and parsed ({} tokens consumed)", token_count);
         
         // 4. Linearization
         println!("--- Starting Inference Engine ---");
@@ -66,8 +71,11 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
                 // 5. MIDI Export
                 if let Some(out_path) = cli.output {
                     println!("--- Starting MIDI Encoder ---");
-                    let bytes = midi::export(&timeline)?;
-                    std::fs::write(&out_path, bytes)?;
+                    // Stream straight to disk through a 64KB buffer
+                    let file = std::fs::File::create(&out_path)?;
+                    let mut out = BufWriter::with_capacity(64 * 1024, file);
+                    midi::write(&timeline, &mut out)?;
+                    out.flush()?;
                     println!("🎹 Saved MIDI to {:?}", out_path);
                 } else {
                     println!("ℹ️  No output file specified. Use --output <FILE.mid> to save.");
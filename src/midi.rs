@@ -2,7 +2,21 @@ use crate::ir::{Timeline, EventKind};
 use midly::{Smf, Header, Format, Timing, Track, TrackEvent, TrackEventKind, MidiMessage, MetaMessage};
 use midly::num::u28;
 
+/// Serializes the Timeline into an in-memory Standard MIDI File.
 pub fn export(timeline: &Timeline) -> Result<Vec<u8>, Box<dyn std::error::Error>> {
+    let mut buffer = Vec::new();
+    build_smf(timeline).write(&mut buffer)?;
+    Ok(buffer)
+}
+
+/// Streams the Standard MIDI File straight into `out` (e.g. a `BufWriter<File>`),
+/// skipping the intermediate byte buffer that `export` returns.
+pub fn write<W: std::io::Write>(timeline: &Timeline, out: W) -> Result<(), Box<dyn std::error::Error>> {
+    build_smf(timeline).write_std(out)?;
+    Ok(())
+}
+
+fn build_smf(timeline: &Timeline) -> Smf<'_> {
     // 1. Create MIDI Header
     // Tenuto uses 1920 PPQ internally. We map this directly to MIDI PPQ.
     let header = Header::new(
@@ -23,8 +37,8 @@ pub fn export(timeline: &Timeline) -> Result<Vec<u8>, Box<dyn std::error::Error>
     });
 
     // Tempo: Convert BPM to Microseconds per Quarter Note
-    // Formula: 60,000,000 / BPM
-    let mpq = 60_000_000 / timeline.tempo;
+    // Formula: 60,000,000 / BPM (guarded for hand-built Timelines, clamped to u24)
+    let mpq = (60_000_000 / timeline.tempo.max(1)).min(0xFF_FFFF);
     conductor_track.push(TrackEvent {
         delta: 0.into(),
         kind: TrackEventKind::Meta(MetaMessage::Tempo(mpq.into())),
@@ -39,13 +53,14 @@ pub fn export(timeline: &Timeline) -> Result<Vec<u8>, Box<dyn std::error::Error>
     smf.tracks.push(conductor_track);
 
     // 3. Process Instrument Tracks
-    // Sort keys to ensure deterministic output
-    let mut sorted_keys: Vec<_> = timeline.tracks.keys().collect();
-    sorted_keys.sort();
-
-    for (idx, key) in sorted_keys.iter().enumerate() {
-        let tenuto_track = &timeline.tracks[*key];
-        let mut midi_events = Vec::new();
+    // Sort (id, track) pairs once to ensure deterministic output
+    // without a second map lookup per track
+    let mut sorted_tracks: Vec<_> = timeline.tracks.iter().collect();
+    sorted_tracks.sort_unstable_by_key(|&(id, _)| id);
+
+    for (idx, (_, tenuto_track)) in sorted_tracks.into_iter().enumerate() {
+        // Sized up front: one Program Change plus an On/Off pair per event
+        let mut midi_events = Vec::with_capacity(1 + 2 * tenuto_track.events.len());
         
         // Channel logic: 0-15. Percussion usually 9 (10 in 1-based).
         // Simple auto-assignment loop, skipping 9 unless explicitly percussion.
@@ -98,7 +113,7 @@ pub fn export(timeline: &Timeline) -> Result<Vec<u8>, Box<dyn std::error::Error>
         midi_events.sort_by(|a, b| a.tick.cmp(&b.tick));
 
         // D. Convert to Delta Time
-        let mut final_track = Vec::new();
+        let mut final_track = Vec::with_capacity(midi_events.len() + 1); // + End of Track
         let mut current_tick = 0;
 
         for e in midi_events {
@@ -124,10 +139,7 @@ pub fn export(timeline: &Timeline) -> Result<Vec<u8>, Box<dyn std::error::Error>
         smf.tracks.push(final_track);
     }
 
-    // 4. Serialize to Bytes
-    let mut buffer = Vec::new();
-    smf.write(&mut buffer)?;
-    Ok(buffer)
+    smf
 }
 
 // Temporary struct for sorting before calculating Deltas
@@ -138,14 +150,21 @@ struct TempEvent<'a> {
 
 // Helper to map string names to MIDI Program Numbers (0-127)
 fn parse_patch_name(name: &str) -> u8 {
-    let n = name.to_lowercase();
-    if n.contains("piano") { return 0; }
-    if n.contains("violin") { return 40; }
-    if n.contains("viola") { return 41; }
-    if n.contains("cello") { return 42; }
-    if n.contains("guitar") { return 24; }
-    if n.contains("bass") { return 32; }
-    if n.contains("flute") { return 73; }
-    if n.contains("drum") || n.contains("kit") { return 0; } // Drums use Channel 10, prog doesn't matter much
-    0 // Default
-}
\ No newline at end of file
+    // Keywords are ASCII, so an ASCII fold is enough (no Unicode case tables)
+    let n = name.to_ascii_lowercase();
+    PATCH_KEYWORDS.iter()
+        .find(|(keyword, _)| n.contains(keyword))
+        .map_or(0, |&(_, program)| program) // Default
+}
+
+// General MIDI program per instrument keyword; first match wins
+const PATCH_KEYWORDS: &[(&str, u8)] = &[
+    ("piano", 0),
+    ("violin", 40),
+    ("viola", 41),
+    ("cello", 42),
+    ("guitar", 24),
+    ("bass", 32),
+    ("flute", 73),
+    ("drum", 0), ("kit", 0), // Drums use Channel 10, prog doesn't matter much
+];
@@ -1,6 +1,7 @@
 use tenutoc::lexer::Token;
 use tenutoc::parser::{self, Score, TopLevel, Statement, Event, Value};
 use tenutoc::ir::{self, Timeline, EventKind};
+use tenutoc::midi;
 use tenutoc::Rational;
 use logos::Logos;
 use chumsky::Parser;
@@ -30,6 +31,17 @@ fn test_rational_to_ticks() {
     assert_eq!(r_dotted.to_ticks(ppq), 2880);
 }
 
+#[test]
+fn test_rational_mul() {
+    // Triplet eighth: 1/8 * 2/3 = 1/12
+    let r = Rational::new(1, 8) * Rational::new(2, 3);
+    assert_eq!(r, Rational::new(1, 12));
+
+    // Cross-reduction keeps large operands from overflowing
+    let big = Rational::new(u64::MAX / 2, 3) * Rational::new(3, u64::MAX / 2);
+    assert_eq!(big, Rational::new(1, 1));
+}
+
 #[test]
 #[should_panic(expected = "Division by Zero")]
 fn test_rational_panic() {
@@ -64,6 +76,15 @@ fn test_lexer_comments_are_ignored() {
     assert_eq!(lex.next(), Some(Ok(Token::PitchLit("d4".into()))));
 }
 
+#[test]
+fn test_lexer_string_escapes() {
+    let src = r#""Say \"dolce\"\n" "plain""#;
+    let mut lex = Token::lexer(src);
+
+    assert_eq!(lex.next(), Some(Ok(Token::StringLit("Say \"dolce\"\n".into()))));
+    assert_eq!(lex.next(), Some(Ok(Token::StringLit("plain".into()))));
+}
+
 #[test]
 fn test_lexer_operators() {
     let src = "{ } [ ] : | = , .";
@@ -91,7 +112,7 @@ fn parse_str(src: &str) -> Option<Score> {
         .filter(|(tok, _)| *tok != Token::InvalidComment)
         .collect();
 
-    let len = src.chars().count();
+    let len = src.len();
     let stream = Stream::from_iter(len..len + 1, token_stream.into_iter());
     
     let (ast, _errs) = parser::parser().parse_recovery(stream);
@@ -136,6 +157,28 @@ fn test_parser_attributes() {
 // 4. INFERENCE ENGINE (LINEARIZATION) TESTS
 // ========================================================================
 
+// Builds a one-staff score ("vln") directly, for AST shapes the parser
+// cannot produce from source text
+fn hand_built_score(events: Vec<Event>) -> Score {
+    Score {
+        header: None,
+        items: vec![
+            TopLevel::Def { id: "vln".into(), label: "Violin".into(), attributes: vec![] },
+            TopLevel::Measure {
+                id: Some(1),
+                content: vec![Statement::Assignment {
+                    staff_id: "vln".into(),
+                    voices: vec![parser::Voice { events }],
+                }],
+            },
+        ],
+    }
+}
+
+fn note(pitch: &str, duration: Option<&str>) -> Event {
+    Event::Note { pitch: pitch.into(), duration: duration.map(Into::into), attributes: vec![] }
+}
+
 #[test]
 fn test_inference_sticky_state() {
     // Tests if duration and octave stickiness works
@@ -189,6 +232,154 @@ fn test_inference_dotted_rhythm() {
     assert_eq!(track.events[0].duration_ticks, 2880);
 }
 
+#[test]
+fn test_inference_multi_dotted_rhythm() {
+    // :4... = 1/4 + 1/8 + 1/16 + 1/32 = 15/32 (1920 * 15/8 = 3600)
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        measure 1 {
+            vln: c4:4... |
+        }
+    }
+    "#;
+
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+    let track = timeline.tracks.get("vln").unwrap();
+
+    assert_eq!(track.events[0].duration_ticks, 3600);
+}
+
+#[test]
+fn test_inference_zero_duration_does_not_panic() {
+    // :0 has no meaning; it must fall back to a quarter instead of dividing by zero
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        measure 1 {
+            vln: c4:0 |
+        }
+    }
+    "#;
+
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+    let track = timeline.tracks.get("vln").unwrap();
+
+    assert_eq!(track.events[0].duration_ticks, 1920);
+}
+
+#[test]
+fn test_inference_zero_tuplet_ratio_is_ignored() {
+    // A zero ratio is ignored like :0 is: the content plays unscaled
+    for (p, q) in [(0, 2), (3, 0)] {
+        let score = hand_built_score(vec![Event::Tuplet {
+            content: parser::Voice { events: vec![note("c4", Some(":8")), note("d", None)] },
+            p,
+            q,
+        }]);
+        let timeline = ir::compile(score).unwrap();
+        let track = timeline.tracks.get("vln").unwrap();
+
+        assert_eq!(track.events[0].duration_ticks, 960);
+        assert_eq!(track.events[1].tick, 960);
+    }
+}
+
+#[test]
+fn test_inference_unrepresentable_duration_falls_back() {
+    // 2^48 with 16 dots overflows den * 2^n; 17 dots exceeds the dot cap.
+    // Both must fall back to a quarter instead of overflowing u64.
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        measure 1 {
+            vln: c4:281474976710656................ d:4................. e:4................ |
+        }
+    }
+    "#;
+
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+    let track = timeline.tracks.get("vln").unwrap();
+
+    assert_eq!(track.events[0].duration_ticks, 1920);
+    assert_eq!(track.events[1].duration_ticks, 1920);
+    // 16 dots is still honoured: 1920 * (2^17 - 1) / 2^16, rounded down
+    assert_eq!(track.events[2].duration_ticks, 3839);
+}
+
+#[test]
+fn test_inference_sticky_duration_through_tuplet() {
+    // c:8 (d e f)/3:2 g -- the sticky :8 carries into the triplet (960 * 2/3)
+    // and must resolve back to a plain eighth once the tuplet closes
+    let score = hand_built_score(vec![
+        note("c4", Some(":8")),
+        Event::Tuplet {
+            content: parser::Voice { events: vec![note("d", None), note("e", None), note("f", None)] },
+            p: 3,
+            q: 2,
+        },
+        note("g", None),
+    ]);
+    let timeline = ir::compile(score).unwrap();
+    let track = timeline.tracks.get("vln").unwrap();
+
+    let timing: Vec<(u64, u64)> = track.events.iter().map(|e| (e.tick, e.duration_ticks)).collect();
+    assert_eq!(timing, vec![(0, 960), (960, 640), (1600, 640), (2240, 640), (2880, 960)]);
+}
+
+#[test]
+fn test_inference_single_sounding_voice_keeps_order() {
+    // Canonical `vln: ... |` form, plus a rest-only second voice: one voice
+    // writes all the events, and its ticks must come out in cursor order.
+    // (A trailing `|` opens an empty voice, so each staff gets its own measure.)
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        def vla "Viola"
+        measure 1 {
+            vln: c4:4 d e |
+        }
+        measure 2 {
+            vla: c3:2 d | r:1 |
+        }
+    }
+    "#;
+
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+
+    let vln: Vec<u64> = timeline.tracks["vln"].events.iter().map(|e| e.tick).collect();
+    assert_eq!(vln, vec![0, 1920, 3840]);
+    let vla: Vec<u64> = timeline.tracks["vla"].events.iter().map(|e| e.tick).collect();
+    assert_eq!(vla, vec![0, 3840]);
+}
+
+#[test]
+fn test_inference_multi_voice_sorted_by_tick() {
+    // Voice 1 is pushed before voice 2, so the track must be re-sorted by tick
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        measure 1 {
+            vln: c4:2 d | e4:4 f g a |
+        }
+    }
+    "#;
+
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+    let track = timeline.tracks.get("vln").unwrap();
+
+    let order: Vec<(u64, u8)> = track.events.iter().map(|e| match e.kind {
+        EventKind::Note { pitch, .. } => (e.tick, pitch),
+        EventKind::Rest => (e.tick, 0),
+    }).collect();
+    assert_eq!(order, vec![(0, 60), (0, 64), (1920, 65), (3840, 62), (3840, 67), (5760, 69)]);
+}
+
 #[test]
 fn test_inference_accidental_parsing() {
     // c#4 -> 61, db4 -> 61, c4 -> 60
@@ -213,6 +404,27 @@ fn test_inference_accidental_parsing() {
     if let EventKind::Note { pitch, .. } = track.events[2].kind { assert_eq!(pitch, 60); }
 }
 
+#[test]
+fn test_inference_double_accidentals() {
+    // Spec 6.1: cx4 -> 62 (double sharp), ebb4 -> 62 (double flat), cb4 -> 59
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        measure 1 {
+            vln: cx4:4 ebb4 cb4 |
+        }
+    }
+    "#;
+
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+    let track = timeline.tracks.get("vln").unwrap();
+
+    if let EventKind::Note { pitch, .. } = track.events[0].kind { assert_eq!(pitch, 62); }
+    if let EventKind::Note { pitch, .. } = track.events[1].kind { assert_eq!(pitch, 62); }
+    if let EventKind::Note { pitch, .. } = track.events[2].kind { assert_eq!(pitch, 59); }
+}
+
 #[test]
 fn test_inference_rest_handling() {
     // Rests should advance time but produce no Note events in this basic IR implementation
@@ -255,6 +467,20 @@ fn test_metadata_extraction() {
     assert_eq!(timeline.tempo, 150);
 }
 
+#[test]
+fn test_metadata_nonpositive_tempo_ignored() {
+    // The MIDI backend divides by BPM, so tempo: 0 keeps the 120 BPM default
+    let src = r#"
+    tenuto {
+        meta { tempo: 0 }
+    }
+    "#;
+    let ast = parse_str(src).unwrap();
+    let timeline = ir::compile(ast).unwrap();
+
+    assert_eq!(timeline.tempo, 120);
+}
+
 #[test]
 fn test_def_attributes() {
     let src = r#"
@@ -268,4 +494,29 @@ fn test_def_attributes() {
     let track = timeline.tracks.get("pno").unwrap();
     assert_eq!(track.label, "Piano");
     assert_eq!(track.patch, "Acoustic Grand");
-}
\ No newline at end of file
+}
+
+// ========================================================================
+// 5. MIDI EXPORT TESTS
+// ========================================================================
+
+#[test]
+fn test_midi_write_matches_export() {
+    // Streaming to a writer must produce the same file as the in-memory export
+    let src = r#"
+    tenuto {
+        def vln "Violin"
+        measure 1 {
+            vln: c4:4 [e4 g4]:2 |
+        }
+    }
+    "#;
+    let timeline = ir::compile(parse_str(src).unwrap()).unwrap();
+
+    let bytes = midi::export(&timeline).unwrap();
+    let mut streamed = Vec::new();
+    midi::write(&timeline, &mut streamed).unwrap();
+
+    assert_eq!(&bytes[..4], b"MThd");
+    assert_eq!(bytes, streamed);
+}